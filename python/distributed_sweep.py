@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+distributed_sweep.py
+SwingSimulator のパラメータ・擾乱スイープを複数ノードで分散実行
+コーディネーターがHTTPワークキューでシナリオのバッチを配布し、
+ステートレスなワーカーが取得・計算・指標返却を繰り返す
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import requests
+
+from simulate_area_network import SwingSimulator
+
+
+def scenario_id(scenario):
+    """シナリオ内容から決まるID（同一内容のシナリオは同じIDになり重複排除される）"""
+    text = json.dumps(scenario, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def grid_scenarios(base, grid):
+    """
+    Masterシートパラメータの格子スイープを作成
+
+    Args:
+        base (dict): 全シナリオ共通の設定（run_headless() のシナリオ形式）
+        grid (dict): {(エリア名, 列名): 値のリスト}
+    """
+    keys = list(grid)
+    scenarios = []
+
+    for values in itertools.product(*(grid[k] for k in keys)):
+        scenario = json.loads(json.dumps(base))
+        overrides = scenario.setdefault('overrides', {})
+        for (area, column), value in zip(keys, values):
+            overrides.setdefault(area, {})[column] = value
+        scenarios.append(scenario)
+
+    return scenarios
+
+
+class SweepCoordinator:
+    """シナリオのバッチ配布・リース管理・結果収集を行うコーディネーター"""
+
+    def __init__(self, scenarios, master_df, batch_size=4, lease_timeout=60.0,
+                 host='127.0.0.1', port=8765, max_attempts=3):
+        self.master = master_df.to_dict(orient='records')
+        self.batch_size = batch_size
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts   # ワーカーを落とし続けるシナリオの配布回数上限
+        self.host = host
+        self.port = port
+
+        # 同一内容のシナリオは1回だけ計算する
+        self.scenarios = {}
+        for scenario in scenarios:
+            self.scenarios.setdefault(scenario_id(scenario), scenario)
+
+        self.pending = deque(self.scenarios)
+        self.leases = {}      # batch_id -> (worker, 期限, シナリオIDリスト)
+        self.results = {}     # シナリオID -> 指標
+        self.attempts = {}    # シナリオID -> 配布回数
+        self.next_batch = 0
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if not self.scenarios:
+            self.finished.set()
+        self.server = None
+
+    def reclaim_expired(self):
+        """
+        期限切れリース（ワーカー喪失）のシナリオを再投入
+
+        max_attempts 回配布しても結果が返らないシナリオは再投入せず、エラーを結果として記録する。
+        """
+        now = time.monotonic()
+        for batch_id, (worker, deadline, ids) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[batch_id]
+                requeued = []
+                for sid in ids:
+                    if sid in self.results:
+                        continue
+                    if self.attempts[sid] >= self.max_attempts:
+                        self.results[sid] = {'error': f"{self.attempts[sid]} 回配布しても"
+                                                      f"結果が返りませんでした"}
+                        print(f"❌ シナリオ {sid} を打ち切りました（配布 {self.attempts[sid]} 回）")
+                    else:
+                        requeued.append(sid)
+                self.pending.extendleft(reversed(requeued))
+                print(f"⚠️  ワーカー {worker} のバッチ {batch_id} が期限切れ: "
+                      f"{len(requeued)} 件を再投入")
+
+        if len(self.results) == len(self.scenarios):
+            self.finished.set()
+
+    def lease(self, worker):
+        """ワーカーにバッチを貸し出す"""
+        with self.lock:
+            self.reclaim_expired()
+
+            ids = []
+            while self.pending and len(ids) < self.batch_size:
+                sid = self.pending.popleft()
+                if sid not in self.results:
+                    ids.append(sid)
+
+            if not ids:
+                return {'status': 'done' if self.finished.is_set() else 'wait'}
+
+            batch_id = self.next_batch
+            self.next_batch += 1
+            self.leases[batch_id] = (worker, time.monotonic() + self.lease_timeout, ids)
+            for sid in ids:
+                self.attempts[sid] = self.attempts.get(sid, 0) + 1
+
+            return {'status': 'batch', 'batch_id': batch_id, 'master': self.master,
+                    'scenarios': {sid: self.scenarios[sid] for sid in ids}}
+
+    def complete(self, batch_id, results):
+        """結果を登録（完了済みシナリオの重複結果は破棄）"""
+        with self.lock:
+            self.leases.pop(batch_id, None)
+            accepted = 0
+            for sid, metrics in results.items():
+                if sid in self.scenarios and sid not in self.results:
+                    self.results[sid] = metrics
+                    accepted += 1
+
+            if len(self.results) == len(self.scenarios):
+                self.finished.set()
+
+            return {'status': 'ok', 'accepted': accepted}
+
+    def status(self):
+        """進捗状況"""
+        with self.lock:
+            return {'total': len(self.scenarios), 'completed': len(self.results),
+                    'pending': len(self.pending), 'leased': len(self.leases)}
+
+    def make_handler(self):
+        """HTTPリクエストハンドラクラスを作成"""
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/status':
+                    self.send_json(coordinator.status())
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+
+                if self.path == '/lease':
+                    self.send_json(coordinator.lease(request.get('worker', '?')))
+                elif self.path == '/complete':
+                    self.send_json(coordinator.complete(request['batch_id'], request['results']))
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass  # アクセスログは出力しない
+
+        return Handler
+
+    def start(self):
+        """HTTPサーバーをバックグラウンドスレッドで起動"""
+        self.server = ThreadingHTTPServer((self.host, self.port), self.make_handler())
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"✓ コーディネーター起動: http://{self.host}:{self.port} "
+              f"({len(self.scenarios)} シナリオ)")
+
+    def wait(self, poll_interval=1.0):
+        """全シナリオ完了まで待機し、結果を返す"""
+        while not self.finished.wait(poll_interval):
+            with self.lock:
+                self.reclaim_expired()
+
+        # ワーカーが 'done' を受け取れるよう少し待ってから停止
+        time.sleep(poll_interval)
+        self.server.shutdown()
+        return {sid: {'scenario': self.scenarios[sid], 'metrics': self.results[sid]}
+                for sid in self.scenarios}
+
+
+def run_worker(url, worker=None, poll_interval=0.5, max_errors=10):
+    """
+    ワーカー: バッチ取得 → ヘッドレス計算 → 指標返却 を全件完了まで繰り返す
+
+    パラメータはバッチと一緒に受け取るため、ワーカー側にExcelファイルは不要。
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    simulator = SwingSimulator()
+    errors = 0
+
+    # 通信失敗を数え、max_errors 回に達したら終了（True を返したら終了）
+    # カウントは結果の返却まで成功した時点（または待機応答）でリセット
+    def connection_failed(e):
+        nonlocal errors
+        errors += 1
+        if errors >= max_errors:
+            print(f"❌ コーディネーターに接続できません: {e}")
+            return True
+        time.sleep(poll_interval)
+        return False
+
+    while True:
+        try:
+            batch = requests.post(f"{url}/lease", json={'worker': worker}, timeout=10).json()
+        except requests.RequestException as e:
+            if connection_failed(e):
+                return
+            continue
+
+        if batch['status'] == 'done':
+            return
+        if batch['status'] == 'wait':
+            errors = 0
+            time.sleep(poll_interval)
+            continue
+
+        master_df = pd.DataFrame(batch['master'])
+        results = {}
+        for sid, scenario in batch['scenarios'].items():
+            try:
+                results[sid] = simulator.run_headless(scenario, master_df)
+            except Exception as e:
+                results[sid] = {'error': str(e)}
+
+        # 返却に失敗した場合はリース期限切れで再投入されるので、次のバッチへ進む
+        try:
+            requests.post(f"{url}/complete", json={'batch_id': batch['batch_id'], 'results': results},
+                          timeout=10).raise_for_status()
+        except requests.RequestException as e:
+            if connection_failed(e):
+                return
+            continue
+        errors = 0
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='SwingSimulator の分散スイープ実行')
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    coord = sub.add_parser('coordinator', help='ワークキューを提供するコーディネーター')
+    coord.add_argument('scenarios', help='シナリオのJSONリストファイル')
+    coord.add_argument('--output', default='sweep_results.json')
+    coord.add_argument('--host', default='0.0.0.0')
+    coord.add_argument('--port', type=int, default=8765)
+    coord.add_argument('--batch-size', type=int, default=4)
+    coord.add_argument('--lease-timeout', type=float, default=60.0)
+    coord.add_argument('--max-attempts', type=int, default=3,
+                       help='結果が返らないシナリオを打ち切るまでの配布回数')
+    coord.add_argument('--local-workers', type=int, default=0,
+                       help='同一マシン上で起動するワーカー数')
+
+    work = sub.add_parser('worker', help='バッチを取得して計算するワーカー')
+    work.add_argument('url', help='コーディネーターのURL (例: http://host:8765)')
+
+    args = parser.parse_args()
+
+    if args.mode == 'worker':
+        run_worker(args.url.rstrip('/'))
+        return
+
+    with open(args.scenarios, encoding='utf-8') as f:
+        scenarios = json.load(f)
+
+    simulator = SwingSimulator()
+    simulator.setup_excel_template()
+    master_df = simulator.load_parameters()
+    if master_df is None:
+        return
+
+    coordinator = SweepCoordinator(scenarios, master_df, args.batch_size,
+                                   args.lease_timeout, args.host, args.port, args.max_attempts)
+    coordinator.start()
+
+    url = f"http://127.0.0.1:{coordinator.port}"
+    workers = [multiprocessing.Process(target=run_worker, args=(url,))
+               for _ in range(args.local_workers)]
+    for p in workers:
+        p.start()
+
+    results = coordinator.wait()
+    for p in workers:
+        p.join()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✓ {len(results)} シナリオの結果を {args.output} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
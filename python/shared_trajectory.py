@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+shared_trajectory.py
+軌道データ (t, y) を共有メモリに置き、後処理ワーカーへコピーなしで受け渡す
+小さな記述子（共有メモリ名・形状・dtype・cum_n）だけをワーカーに送り、
+COI計算やフレーム描画を複数コアに分散する
+"""
+
+import os
+import sys
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+
+def create_trajectory(n_times, n_state, cum_n, dtype=np.float64):
+    """
+    共有メモリ上に軌道を確保
+
+    レイアウトは [t (T,) | y (T, n_state)] の連続領域。
+
+    Returns:
+        tuple: (記述子, SharedMemory, t, y)。作成側は使用後に release_trajectory(shm, unlink=True)
+    """
+    dtype = np.dtype(dtype)
+    nbytes = dtype.itemsize * n_times * (1 + n_state)
+    shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+    descriptor = {
+        'name': shm.name,
+        'shape': (int(n_times), int(n_state)),
+        'dtype': dtype.str,
+        'cum_n': [int(c) for c in cum_n],
+    }
+    t, y = trajectory_views(shm, descriptor)
+    return descriptor, shm, t, y
+
+
+def trajectory_views(shm, descriptor):
+    """共有メモリ上の t, y をコピーなしのndarrayビューとして取得"""
+    n_times, n_state = descriptor['shape']
+    dtype = np.dtype(descriptor['dtype'])
+    t = np.ndarray((n_times,), dtype=dtype, buffer=shm.buf)
+    y = np.ndarray((n_times, n_state), dtype=dtype, buffer=shm.buf,
+                   offset=dtype.itemsize * n_times)
+    return t, y
+
+
+def attach_trajectory(descriptor, track=True):
+    """
+    記述子から共有メモリの軌道に接続（コピーなし）
+
+    Args:
+        track (bool): resource_tracker に登録するか。multiprocessing の子プロセスは作成側と
+            トラッカーを共有するので True のまま。作成側と無関係なプロセスから接続する場合は
+            False にする（そのプロセスの終了時に共有メモリが破棄されないように）
+
+    Returns:
+        tuple: (SharedMemory, t, y)。使用後は release_trajectory(shm)
+    """
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=descriptor['name'], track=track)
+    else:
+        shm = shared_memory.SharedMemory(name=descriptor['name'])
+        if not track:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+    t, y = trajectory_views(shm, descriptor)
+    return shm, t, y
+
+
+def release_trajectory(shm, unlink=False):
+    """共有メモリを閉じる（作成側は unlink=True で破棄）"""
+    shm.close()
+    if unlink:
+        shm.unlink()
+
+
+# ワーカープロセス内の状態（initializerで設定）
+worker_state = {}
+
+
+def init_worker(simulator, descriptor, render=False):
+    """ワーカー初期化: 共有メモリへ一度だけ接続"""
+    if render:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    shm, t, y = attach_trajectory(descriptor)
+    worker_state.update(simulator=simulator, descriptor=descriptor, shm=shm, t=t, y=y)
+
+
+def coi_worker(time_range):
+    """ワーカー: 担当時刻範囲のCOIを計算"""
+    start, stop = time_range
+    cum_n = np.array(worker_state['descriptor']['cum_n'])
+    angles, freqs = worker_state['simulator'].compute_coi(worker_state['y'][start:stop],
+                                                          len(cum_n) - 1, cum_n)
+    return start, angles, freqs
+
+
+def split_range(n, n_parts):
+    """[0, n) をほぼ等分した区間のリスト"""
+    edges = np.linspace(0, n, n_parts + 1).astype(int)
+    return [(lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+
+def parallel_coi(simulator, descriptor, n_workers=None):
+    """共有メモリ上の軌道からCOI時系列を並列計算し、(coi_angles, coi_frequencies) を返す"""
+    n_workers = n_workers or os.cpu_count()
+    n_times = descriptor['shape'][0]
+    ns = len(descriptor['cum_n']) - 1
+
+    coi_angles = np.zeros((n_times, ns))
+    coi_frequencies = np.zeros((n_times, ns))
+
+    with multiprocessing.Pool(n_workers, initializer=init_worker,
+                              initargs=(simulator, descriptor)) as pool:
+        for start, angles, freqs in pool.imap_unordered(coi_worker, split_range(n_times, n_workers)):
+            coi_angles[start:start + len(angles)] = angles
+            coi_frequencies[start:start + len(freqs)] = freqs
+
+    return coi_angles, coi_frequencies
+
+
+def render_worker(task):
+    """ワーカー: 担当フレームを描画してPNG保存"""
+    frame_indices, base_lon_lat, areas, out_dir = task
+    simulator = worker_state['simulator']
+    cum_n = np.array(worker_state['descriptor']['cum_n'])
+    t, y = worker_state['t'], worker_state['y']
+
+    import matplotlib.pyplot as plt
+    fig, draw_frame = simulator.create_network_figure(len(cum_n) - 1, np.diff(cum_n), cum_n,
+                                                      base_lon_lat, areas)
+    paths = []
+    for k in frame_indices:
+        draw_frame(t[k], y[k])
+        path = os.path.join(out_dir, f'frame_{k:05d}.png')
+        fig.savefig(path)
+        paths.append(path)
+    plt.close(fig)
+
+    return paths
+
+
+def render_frames_parallel(simulator, descriptor, base_lon_lat, areas, out_dir,
+                           frame_indices=None, n_workers=None):
+    """共有メモリ上の軌道からネットワーク可視化のフレームを並列描画（PNG）"""
+    n_workers = n_workers or os.cpu_count()
+    if frame_indices is None:
+        frame_indices = np.arange(descriptor['shape'][0])
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 地図データは親で一度だけ取得し、各ワーカーに引き継ぐ
+    simulator.get_japan_map()
+
+    tasks = [(frame_indices[lo:hi], base_lon_lat, areas, out_dir)
+             for lo, hi in split_range(len(frame_indices), n_workers)]
+
+    with multiprocessing.Pool(n_workers, initializer=init_worker,
+                              initargs=(simulator, descriptor, True)) as pool:
+        paths = [p for chunk in pool.map(render_worker, tasks) for p in chunk]
+
+    return sorted(paths)
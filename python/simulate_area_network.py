@@ -11,11 +11,18 @@ import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
-from scipy.integrate import odeint
+from scipy.integrate import solve_ivp, OdeSolution
+from scipy.sparse import coo_matrix
 from generate_area_template import generate_template
+from shared_trajectory import create_trajectory
 import requests
 import os
 import sys
+import threading
+from collections import deque
+
+# 感度解析の対象パラメータ（Masterシートの列名）
+SENSITIVITY_PARAMETERS = ['p_m', 'b', 'b_int', 'epsilon']
 
 class SwingSimulator:
     def __init__(self):
@@ -50,6 +57,23 @@ class SwingSimulator:
         # 日本地図データのキャッシュ
         self.japan_map_data = None
         
+        # 数値積分・出力設定
+        self.t_final = 25.0          # シミュレーション時間 [s]
+        self.ode_method = 'BDF'      # solve_ivpの積分法（BDF/Radauは疎ヤコビアンを利用）
+        self.rtol = 1e-6
+        self.atol = 1e-8
+        self.dense_samples = 20000   # 密出力からCOIを評価する点数
+        self.plot_points = 1000      # 時系列プロットの点数上限
+        self.max_frames = 500        # アニメーションのフレーム数上限
+        self.chunk_elems = 2_000_000 # 密出力を一度に評価する要素数の上限
+        self.sensitivity_method = 'DOP853'  # 感度解析（拡大系）の積分法
+        
+        # ライブ可視化設定（積分と並行して描画）
+        self.live_view = True        # Falseで従来どおり積分完了後に描画
+        self.live_chunk = 0.25       # ワーカーが一度に積分する時間幅 [s]
+        self.frame_dt = 0.05         # フレーム間隔 [s]
+        self.live_buffer = 64        # リングバッファのフレーム数
+        
     def get_japan_map(self):
         """日本の地図データを取得（キャッシュ機能付き）"""
         if self.japan_map_data is not None:
@@ -236,6 +260,55 @@ class SwingSimulator:
             print("\n✓ 擾乱なしでシミュレーションを実行します")
             
         return disturbances
+
+    def setup_events(self, areas):
+        """イベントスケジュール（故障発生・除去、連系線遮断、p_m変更）の対話型入力"""
+        print("\n=== イベント設定 ===")
+        events = []
+        kinds = {'1': 'fault', '2': 'clear', '3': 'trip', '4': 'set_p_m'}
+
+        while True:
+            print("\nイベントを追加しますか？")
+            add_event = input("  y: イベント追加, n: 続行 (y/n): ").strip().lower()
+
+            if add_event != 'y':
+                break
+
+            print("  1: 故障発生 (b=0), 2: 故障除去, 3: 連系線遮断, 4: p_m変更")
+            kind = kinds.get(input("イベント種別: ").strip())
+            if kind is None:
+                print("❌ 1-4の番号を入力してください")
+                continue
+
+            try:
+                event = {'time': float(input("発生時刻 [s] (例: 0.1): ").strip()), 'kind': kind}
+
+                if kind == 'trip':
+                    print(f"連系線はエリア番号の隣接ペアで指定します (1-{len(areas)})")
+                    area_idx = int(input("エリア番号 (隣の番号との連系線): ").strip()) - 1
+                    event['areas'] = (area_idx, area_idx + 1)
+                    valid = 0 <= area_idx < len(areas) - 1
+                else:
+                    event['area'] = int(input(f"エリア番号 (1-{len(areas)}): ").strip()) - 1
+                    valid = 0 <= event['area'] < len(areas)
+                    if kind == 'set_p_m':
+                        event['value'] = float(input("新しい p_m [p.u.]: ").strip())
+
+            except ValueError:
+                print("❌ 数値を入力してください")
+                continue
+
+            if not valid or not 0 <= event['time'] < self.t_final:
+                print("❌ エリア番号または時刻が範囲外です")
+                continue
+
+            events.append(event)
+            print(f"📝 イベントを追加しました: {event}")
+
+        if events:
+            print(f"\n✓ 合計 {len(events)} 個のイベントが設定されました")
+
+        return events
         
     def create_connection_matrix(self, selected_indices, ns):
         """接続行列の作成"""
@@ -255,46 +328,433 @@ class SwingSimulator:
                     
         return cmat
         
-    def dynamics(self, y, t, n_each, ns, cum_n, cmat, p_m, b, b_int, epsl):
-        """動力学方程式"""
+    def build_network(self, n_each, ns, cum_n, p_m, b, b_int, epsl):
+        """
+        結合構造（有向エッジリスト）とヤコビアン非零パターンを事前構築
+
+        エリア内リング結合とエリア間結合（各エリアの最初の発電機 ↔ 前エリアの中央発電機）を、
+        発電機 dst の加速度に -w * sin(δ_dst - δ_src) として寄与するエッジで表す。
+        イベントは重み・パラメータ配列を書き換えるだけで構造は再構築しない。
+        """
         g_total = cum_n[-1]
-        dy = np.zeros(2 * g_total)
-        
+        src, dst, w, tie_of = [], [], [], []
+
+        def add_edge(d, s_, weight, tie=None):
+            dst.append(d)
+            src.append(s_)
+            w.append(weight)
+            tie_of.append(tie)
+
         for i in range(ns):
             ni = n_each[i]
             base = cum_n[i]
-            
             for j in range(ni):
                 idx = base + j
                 prev_idx = base + (ni - 1) if j == 0 else idx - 1
                 next_idx = base if j == (ni - 1) else idx + 1
-                
-                # エリア間結合項
-                g = 0
-                # 各エリアの最初の発電機が前のエリアの中央発電機と結合
+
+                # エリア内リング結合
+                add_edge(idx, prev_idx, b_int[i])
+                add_edge(idx, next_idx, b_int[i])
+
+                # エリア間結合（最初の発電機 ↔ 前エリアの中央発電機）
                 if i > 0 and j == 0:
-                    prev_area_idx = cum_n[i-1] + n_each[i-1] // 2
-                    g += np.sin(y[idx] - y[prev_area_idx])
-                
-                # 各エリアの中央発電機が次のエリアの最初の発電機と結合
+                    add_edge(idx, cum_n[i-1] + n_each[i-1] // 2, epsl[i] * b_int[i], (i-1, i))
+
+                # エリア間結合（中央発電機 ↔ 次エリアの最初の発電機）
                 if i < ns - 1 and j == ni // 2:
-                    next_area_idx = cum_n[i+1]
-                    g += np.sin(y[idx] - y[next_area_idx])
-                
-                delta = y[idx]
-                omega = y[g_total + idx]
-                
-                dy[idx] = omega
-                dy[g_total + idx] = (p_m[i] 
-                                   - b[i] * np.sin(delta)
-                                   - b_int[i] * (np.sin(delta - y[prev_idx]) + 
-                                                np.sin(delta - y[next_idx]))
-                                   - epsl[i] * b_int[i] * g)
-                                   
-        return dy
-        
-    def visualize_network(self, t, y, ns, n_each, cum_n, base_lon_lat, areas):
-        """ネットワークの可視化"""
+                    add_edge(idx, cum_n[i+1], epsl[i] * b_int[i], (i, i+1))
+
+        src = np.array(src, dtype=int)
+        dst = np.array(dst, dtype=int)
+        w = np.array(w, dtype=float)
+
+        # 連系線 (エリアi, エリアi+1) → エッジ番号
+        ties = {}
+        for e, tie in enumerate(tie_of):
+            if tie is not None:
+                ties.setdefault(tie, []).append(e)
+        ties = {tie: np.array(edges, dtype=int) for tie, edges in ties.items()}
+
+        # ヤコビアン非零パターン: [[0, I], [∂a/∂δ, 0]]
+        gen = np.arange(g_total)
+        jac_rows = np.concatenate([gen, g_total + gen, g_total + dst])
+        jac_cols = np.concatenate([g_total + gen, gen, src])
+
+        area_of = np.repeat(np.arange(ns), n_each)
+
+        # エッジ重みのパラメータ微分（感度解析用）: 重みは dst 側エリアの b_int, epsilon で決まる
+        edge_area = area_of[dst]
+        is_tie = np.array([tie is not None for tie in tie_of], dtype=bool)
+        epsl = np.asarray(epsl, dtype=float)
+        b_int = np.asarray(b_int, dtype=float)
+
+        return {
+            'ns': ns, 'n_each': np.asarray(n_each), 'cum_n': np.asarray(cum_n),
+            'g_total': g_total, 'area_of': area_of,
+            'src': src, 'dst': dst, 'w': w, 'w0': w.copy(), 'ties': ties,
+            'p_m_g': np.asarray(p_m, dtype=float)[area_of],
+            'b_g': np.asarray(b, dtype=float)[area_of],
+            'b0_g': np.asarray(b, dtype=float)[area_of],
+            'jac_rows': jac_rows, 'jac_cols': jac_cols,
+            'edge_on': np.ones(len(w)), 'b_on': np.ones(g_total), 'p_m_on': np.ones(g_total),
+            'edge_area': edge_area,
+            'edge_dw_dbint': np.where(is_tie, epsl[edge_area], 1.0),
+            'edge_dw_deps': np.where(is_tie, b_int[edge_area], 0.0),
+        }
+
+    def network_dynamics(self, t, y, net):
+        """動力学方程式（エッジリストによるベクトル化版）"""
+        g_total = net['g_total']
+        delta = y[:g_total]
+        omega = y[g_total:]
+
+        flow = net['w'] * np.sin(delta[net['dst']] - delta[net['src']])
+        accel = (net['p_m_g'] - net['b_g'] * np.sin(delta)
+                 - np.bincount(net['dst'], weights=flow, minlength=g_total))
+
+        return np.concatenate([omega, accel])
+
+    def network_jacobian(self, t, y, net):
+        """ヤコビアン（事前構築した非零パターンに値を詰めた疎行列）"""
+        g_total = net['g_total']
+        delta = y[:g_total]
+
+        coupling = net['w'] * np.cos(delta[net['dst']] - delta[net['src']])
+        diag = (-net['b_g'] * np.cos(delta)
+                - np.bincount(net['dst'], weights=coupling, minlength=g_total))
+        data = np.concatenate([np.ones(g_total), diag, coupling])
+
+        return coo_matrix((data, (net['jac_rows'], net['jac_cols'])),
+                          shape=(2 * g_total, 2 * g_total)).tocsr()
+
+    def apply_event(self, net, event):
+        """
+        イベントを結合構造・パラメータ配列に差分適用
+
+        event: {'time': t, 'kind': 種別, ...}
+          - 'fault'   : {'area': i}            エリアiの b を 0 に（故障発生）
+          - 'clear'   : {'area': i}            エリアiの b を元に戻す（故障除去）
+          - 'trip'    : {'areas': (i, j)}      エリアi-j間の連系線を遮断
+          - 'set_p_m' : {'area': i, 'value': v} エリアiの p_m を v に変更
+        """
+        kind = event['kind']
+
+        if kind == 'trip':
+            tie = tuple(sorted(event['areas']))
+            if tie not in net['ties']:
+                raise ValueError(f"連系線が存在しません: {tie}")
+            net['w'][net['ties'][tie]] = 0.0
+            net['edge_on'][net['ties'][tie]] = 0.0
+            return
+
+        area = event['area']
+        gens = slice(net['cum_n'][area], net['cum_n'][area + 1])
+
+        if kind == 'fault':
+            net['b_g'][gens] = 0.0
+            net['b_on'][gens] = 0.0
+        elif kind == 'clear':
+            net['b_g'][gens] = net['b0_g'][gens]
+            net['b_on'][gens] = 1.0
+        elif kind == 'set_p_m':
+            net['p_m_g'][gens] = event['value']
+            net['p_m_on'][gens] = 0.0
+        else:
+            raise ValueError(f"未対応のイベント種別です: {kind}")
+
+    def iter_segments(self, init_conditions, t_final, net, events=None, chunk=None,
+                      sensitivity=False):
+        """
+        イベント時刻（と chunk 間隔）で区間分割して積分し、区間ごとの補間解を順に返す
+
+        イベントは net の作業用コピーに差分適用する（呼び出し側の net は不変）。
+        sensitivity=True の場合は変分方程式を連立した拡大系を積分する。
+        """
+        net = dict(net, w=net['w'].copy(), p_m_g=net['p_m_g'].copy(),
+                   b_g=net['b_g'].copy(), edge_on=net['edge_on'].copy(),
+                   b_on=net['b_on'].copy(), p_m_on=net['p_m_on'].copy())
+        pending = sorted(events or [], key=lambda e: e['time'])
+
+        if sensitivity:
+            fun = lambda t, z: self.sensitivity_dynamics(t, z, net)
+            options = dict(method=self.sensitivity_method, dense_output=True,
+                           rtol=self.rtol, atol=self.atol)
+        else:
+            fun = lambda t, y: self.network_dynamics(t, y, net)
+            options = dict(method=self.ode_method, dense_output=True,
+                           rtol=self.rtol, atol=self.atol)
+            # 事前構築した疎ヤコビアンを渡す（LSODAは密行列しか扱えずメモリが状態数の2乗で
+            # 増えるため渡さない。大規模系では BDF/Radau を使う）
+            if self.ode_method in ('BDF', 'Radau'):
+                options['jac'] = lambda t, y: self.network_jacobian(t, y, net)
+
+        t0 = 0.0
+        y0 = np.asarray(init_conditions, dtype=float)
+        k = 0
+
+        while t0 < t_final:
+            # 現時刻までのイベントを適用
+            while k < len(pending) and pending[k]['time'] <= t0:
+                self.apply_event(net, pending[k])
+                k += 1
+
+            t1 = min(pending[k]['time'], t_final) if k < len(pending) else t_final
+            if chunk is not None:
+                t1 = min(t1, t0 + chunk)
+
+            result = solve_ivp(fun, (t0, t1), y0, **options)
+            if not result.success:
+                raise RuntimeError(f"ODE求解に失敗しました: {result.message}")
+
+            yield result.sol
+            t0, y0 = t1, result.y[:, -1]
+
+    def parameter_forcing(self, y, net):
+        """
+        加速度のパラメータ微分 ∂a/∂p (G, 4*ns)
+
+        列の並びは SENSITIVITY_PARAMETERS の順 × エリア（列番号 = k*ns + エリア）。
+        """
+        g_total = net['g_total']
+        ns = net['ns']
+        delta = y[:g_total]
+        gen = np.arange(g_total)
+        dst = net['dst']
+        area_of = net['area_of']
+        edge_area = net['edge_area']
+
+        coupling = -np.sin(delta[dst] - delta[net['src']]) * net['edge_on']
+        rows = np.concatenate([gen, gen, dst, dst])
+        cols = np.concatenate([area_of, ns + area_of, 2*ns + edge_area, 3*ns + edge_area])
+        data = np.concatenate([net['p_m_on'],                         # p_m
+                               -np.sin(delta) * net['b_on'],          # b
+                               coupling * net['edge_dw_dbint'],       # b_int
+                               coupling * net['edge_dw_deps']])       # epsilon
+
+        return coo_matrix((data, (rows, cols)), shape=(g_total, 4 * ns)).toarray()
+
+    def sensitivity_dynamics(self, t, z, net):
+        """
+        スイング方程式と変分方程式の拡大系 z = [x, vec(S)]
+
+        S = ∂x/∂p は dS/dt = J(x) S + ∂f/∂p に従う（J は network_jacobian() の疎行列）。
+        """
+        n_state = 2 * net['g_total']
+        x = z[:n_state]
+        sens = z[n_state:].reshape(n_state, -1)
+
+        d_sens = self.network_jacobian(t, x, net) @ sens
+        d_sens[net['g_total']:] += self.parameter_forcing(x, net)
+
+        return np.concatenate([self.network_dynamics(t, x, net), d_sens.ravel()])
+
+    def initial_sensitivity(self, n_each, cum_n, p_m, b, disturbances=()):
+        """初期条件のパラメータ微分 ∂x0/∂p（平衡角 arcsin(p_m/b) の微分、擾乱機は固定値）"""
+        ns = len(n_each)
+        g_total = cum_n[-1]
+        area_of = np.repeat(np.arange(ns), n_each)
+        p_m = np.asarray(p_m, dtype=float)
+        b = np.asarray(b, dtype=float)
+        root = np.sqrt(b**2 - p_m**2)
+
+        sens = np.zeros((2 * g_total, 4 * ns))
+        gen = np.arange(g_total)
+        sens[gen, area_of] = (1.0 / root)[area_of]
+        sens[gen, ns + area_of] = (-p_m / (b * root))[area_of]
+
+        for area_idx, gen_num, _ in disturbances:
+            sens[cum_n[area_idx] + gen_num - 1] = 0.0
+
+        return sens
+
+    def join_segments(self, segments):
+        """区間ごとの補間解を連結して1つの補間解にする"""
+        ts = [segments[0].ts[0]]
+        interpolants = []
+        for seg in segments:
+            ts.extend(seg.ts[1:])
+            interpolants.extend(seg.interpolants)
+        return OdeSolution(np.array(ts), interpolants)
+
+    def integrate(self, init_conditions, t_final, net, events=None):
+        """密出力付きでODEを求解（イベント時刻で区間分割、任意時刻で評価できる補間解を返す）"""
+        return self.join_segments(list(self.iter_segments(init_conditions, t_final, net, events)))
+
+    def produce_frames(self, init_conditions, t_final, net, events, frames, state):
+        """
+        ワーカースレッド: チャンク単位で積分し、フレームをリングバッファへ投入
+
+        frames は maxlen 付き deque。満杯時は最古のフレームが捨てられる（描画側が遅い場合）。
+        積分は描画の進み具合によらず最後まで進める。
+        """
+        try:
+            frames.append((0.0, np.asarray(init_conditions, dtype=float)))
+            t_next = self.frame_dt
+
+            for seg in self.iter_segments(init_conditions, t_final, net, events,
+                                          chunk=self.live_chunk):
+                state['segments'].append(seg)
+
+                # この区間内のフレーム時刻を補間解から評価して投入
+                t_frames = np.arange(t_next, seg.t_max + 1e-12, self.frame_dt)
+                if len(t_frames):
+                    for t_k, y_k in zip(t_frames, seg(t_frames).T):
+                        if len(frames) == frames.maxlen:
+                            state['dropped'] += 1
+                        frames.append((t_k, y_k))
+                    t_next = t_frames[-1] + self.frame_dt
+            state['completed'] = True
+        except Exception as e:
+            state['error'] = e
+        finally:
+            state['done'].set()
+
+    def visualize_live(self, init_conditions, net, events, ns, n_each, cum_n, base_lon_lat, areas):
+        """
+        積分と並行してネットワークを可視化（プロデューサー/コンシューマー方式）
+
+        積分はワーカースレッドでチャンク単位に進め、描画は到着済みフレームから順に行う。
+        積分中に描画が追いつかない場合は古いフレームを捨て（積分は待たせない）、
+        積分完了後は最後に描画した時刻以降を連結した補間解から frame_dt 間隔で再生する。
+        ウィンドウを途中で閉じても積分は最後まで進め、連結した補間解を返す。
+        """
+        frames = deque(maxlen=self.live_buffer)
+        state = {'segments': [], 'dropped': 0, 'completed': False, 'error': None,
+                 'done': threading.Event()}
+
+        worker = threading.Thread(target=self.produce_frames, daemon=True,
+                                  args=(init_conditions, self.t_final, net, events, frames, state))
+        worker.start()
+
+        fig, draw_frame = self.create_network_figure(ns, n_each, cum_n, base_lon_lat, areas)
+
+        # 積分中は到着済みフレームを順に取り出す（未到着の間は None で描画をスキップ）
+        def frame_source():
+            t_shown = 0.0
+            while not state['done'].is_set():
+                if frames:
+                    frame = frames.popleft()
+                    t_shown = frame[0]
+                    yield frame
+                else:
+                    yield None
+
+            if not state['completed']:
+                return
+
+            # 積分完了後: 残りの区間を補間解から再生
+            state['solution'] = sol = self.join_segments(state['segments'])
+            for t_k in np.arange(t_shown + self.frame_dt, self.t_final + 1e-12, self.frame_dt):
+                yield t_k, sol(t_k)
+
+        def animate(frame):
+            if frame is not None:
+                draw_frame(*frame)
+
+        ani = FuncAnimation(fig, animate, frames=frame_source, interval=50,
+                            blit=False, cache_frame_data=False)
+        plt.show()
+
+        if worker.is_alive():
+            print("ウィンドウが閉じられました。残りの区間を計算中...")
+        worker.join()
+
+        if state['error'] is not None:
+            raise state['error']
+        if state['dropped']:
+            print(f"⚠️  積分中に描画が追いつかず {state['dropped']} フレームをスキップしました")
+        if 'solution' not in state:
+            state['solution'] = self.join_segments(state['segments'])
+        return state['solution']
+
+    def compute_coi(self, y, ns, cum_n):
+        """状態行列 (T, 2G) からエリア別COI角度・周波数 (T, ns) を計算"""
+        y = np.atleast_2d(y)
+        g_total = cum_n[-1]
+        counts = np.diff(cum_n)
+        starts = cum_n[:-1]
+        coi_angles = np.add.reduceat(np.mod(y[:, :g_total], 2*np.pi), starts, axis=1) / counts
+        coi_frequencies = np.add.reduceat(y[:, g_total:2*g_total], starts, axis=1) / counts
+        return coi_angles, coi_frequencies
+
+    def sample_coi(self, sol, t_eval, ns, cum_n):
+        """密出力解を分割評価してCOI時系列を計算（全状態を一度に展開しない）"""
+        chunk = max(1, self.chunk_elems // (2 * cum_n[-1]))
+        coi_angles = np.zeros((len(t_eval), ns))
+        coi_frequencies = np.zeros((len(t_eval), ns))
+
+        for k in range(0, len(t_eval), chunk):
+            t_chunk = t_eval[k:k + chunk]
+            angles, freqs = self.compute_coi(sol(t_chunk).T, ns, cum_n)
+            coi_angles[k:k + chunk] = angles
+            coi_frequencies[k:k + chunk] = freqs
+
+        return coi_angles, coi_frequencies
+
+    def sample_shared(self, sol, t_eval, cum_n):
+        """
+        密出力解を共有メモリ上の軌道に直接書き込む（分割評価、中間コピーなし）
+
+        Returns:
+            tuple: (記述子, SharedMemory)。記述子をワーカーに渡すと attach_trajectory() で
+            コピーなしに接続できる。使用後は release_trajectory(shm, unlink=True)
+        """
+        n_state = 2 * cum_n[-1]
+        descriptor, shm, t, y = create_trajectory(len(t_eval), n_state, cum_n)
+        t[:] = t_eval
+
+        chunk = max(1, self.chunk_elems // n_state)
+        for k in range(0, len(t_eval), chunk):
+            y[k:k + chunk] = sol(t_eval[k:k + chunk])[:n_state].T
+
+        return descriptor, shm
+
+    def downsample_indices(self, values, n_points):
+        """
+        ピーク・ボトム保持の間引きインデックスを計算（LTTB系のmin/max法）
+
+        時間軸をバケットに分割し、各バケットで最大値・最小値をとる点を残す。
+        values が (T, K) の場合は列ごとに正規化した包絡線の最大・最小を用いる。
+        返すインデックス数は n_points 以下（n_points < 4 では始点・終点と最大偏差点を優先）。
+        """
+        if n_points < 1:
+            raise ValueError(f"n_points は1以上で指定してください: {n_points}")
+        values = np.asarray(values, dtype=float)
+        n = values.shape[0]
+        if n <= n_points:
+            return np.arange(n)
+        if values.ndim == 1:
+            values = values[:, None]
+
+        # 列ごとに正規化して上側・下側包絡線を作成
+        span = np.ptp(values, axis=0)
+        span[span == 0] = 1.0
+        norm = (values - values.min(axis=0)) / span
+        upper = norm.max(axis=1)
+        lower = norm.min(axis=1)
+
+        # バケットを作れない小さな上限: 始点 → 終点 → 始点から最も離れた点 の順に残す
+        if n_points < 4:
+            peak = np.abs(norm - norm[0]).max(axis=1).argmax()
+            return np.unique([0, n - 1, peak][:n_points])
+
+        # 始点・終点を除いた区間を (n_points-2)/2 個のバケットに分割
+        n_buckets = max((n_points - 2) // 2, 1)
+        edges = np.linspace(1, n - 1, n_buckets + 1).astype(int)
+
+        indices = [0]
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            if hi <= lo:
+                continue
+            indices.append(lo + np.argmax(upper[lo:hi]))
+            indices.append(lo + np.argmin(lower[lo:hi]))
+        indices.append(n - 1)
+
+        return np.unique(indices)
+
+    def create_network_figure(self, ns, n_each, cum_n, base_lon_lat, areas):
+        """ネットワーク可視化の図を作成し、(fig, 1フレーム描画関数) を返す"""
         g_total = cum_n[-1]
         scale = 4
         rad_base = 0.25
@@ -360,19 +820,16 @@ class SwingSimulator:
         
         plt.tight_layout()
         
-        # アニメーション関数
-        def animate(frame):
-            if frame >= len(t):
-                return
-                
+        # フレーム描画関数
+        def draw_frame(t_k, y_k):
             # COI計算
             d_mean = np.zeros(ns)
             w_mean = np.zeros(ns)
             
             for i in range(ns):
                 idx_range = slice(cum_n[i], cum_n[i+1])
-                d_mean[i] = np.mean(np.mod(y[frame, idx_range], 2*np.pi))
-                w_mean[i] = np.mean(y[frame, g_total + cum_n[i]:g_total + cum_n[i+1]])
+                d_mean[i] = np.mean(np.mod(y_k[idx_range], 2*np.pi))
+                w_mean[i] = np.mean(y_k[g_total + cum_n[i]:g_total + cum_n[i+1]])
             
             # COIベクトル
             dx = scale * w_mean * np.cos(d_mean)
@@ -389,7 +846,7 @@ class SwingSimulator:
                 
                 # 発電機角度取得
                 idx_range = slice(cum_n[i], cum_n[i+1])
-                del_abs = np.mod(y[frame, idx_range], 2*np.pi)
+                del_abs = np.mod(y_k[idx_range], 2*np.pi)
                 
                 # 発電機位置更新 (マップ)
                 gen_x = new_coords[i, 0] + rad_vec[i] * np.cos(del_abs)
@@ -400,36 +857,51 @@ class SwingSimulator:
                 line_plots[i].set_ydata(del_abs)
             
             # 時間表示更新
-            time_text1.set_text(f't = {t[frame]:.2f} s')
-            time_text2.set_text(f't = {t[frame]:.2f} s')
-            
+            time_text1.set_text(f't = {t_k:.2f} s')
+            time_text2.set_text(f't = {t_k:.2f} s')
+
+        return fig, draw_frame
+
+    def visualize_network(self, t, y, ns, n_each, cum_n, base_lon_lat, areas, max_frames=None):
+        """ネットワークの可視化"""
+        # フレーム数上限を超える場合はCOI周波数のピークを保持して間引く
+        max_frames = self.max_frames if max_frames is None else max_frames
+        if len(t) > max_frames:
+            _, coi_frequencies = self.compute_coi(y, ns, cum_n)
+            frame_idx = self.downsample_indices(coi_frequencies, max_frames)
+            t, y = t[frame_idx], y[frame_idx]
+
+        fig, draw_frame = self.create_network_figure(ns, n_each, cum_n, base_lon_lat, areas)
+
+        # アニメーション関数
+        def animate(frame):
+            if frame >= len(t):
+                return
+            draw_frame(t[frame], y[frame])
+
         # アニメーション実行
         ani = FuncAnimation(fig, animate, frames=len(t), interval=50, blit=False)
         plt.show()
         
         return ani
         
-    def plot_coi_timeseries(self, t, y, ns, n_each, cum_n, areas):
-        """COI時系列プロット"""
-        g_total = cum_n[-1]
-        
+    def plot_coi_timeseries(self, t, y, ns, n_each, cum_n, areas, coi=None, max_points=None):
+        """COI時系列プロット（coi=(角度, 周波数) を渡した場合は y を使わない）"""
         # COI計算
-        coi_angles = np.zeros((len(t), ns))
-        coi_frequencies = np.zeros((len(t), ns))
-        
-        for k in range(len(t)):
-            for i in range(ns):
-                idx_range = slice(cum_n[i], cum_n[i+1])
-                coi_angles[k, i] = np.mean(np.mod(y[k, idx_range], 2*np.pi))
-                coi_frequencies[k, i] = np.mean(y[k, g_total + cum_n[i]:g_total + cum_n[i+1]])
-        
+        if coi is None:
+            coi_angles, coi_frequencies = self.compute_coi(y, ns, cum_n)
+        else:
+            coi_angles, coi_frequencies = coi
+
         # プロット
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
         colors = plt.cm.tab10(np.linspace(0, 1, ns))
-        
+        max_points = self.plot_points if max_points is None else max_points
+
         # COI角度
         for i in range(ns):
-            ax1.plot(t, coi_angles[:, i], color=colors[i], label=areas[i], linewidth=2)
+            idx = self.downsample_indices(coi_angles[:, i], max_points)
+            ax1.plot(t[idx], coi_angles[idx, i], color=colors[i], label=areas[i], linewidth=2)
         ax1.set_ylabel('COI Angle [rad]')
         ax1.set_title('Center of Inertia (COI) Time Series')
         ax1.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
@@ -437,7 +909,8 @@ class SwingSimulator:
         
         # COI周波数
         for i in range(ns):
-            ax2.plot(t, coi_frequencies[:, i], color=colors[i], label=areas[i], linewidth=2)
+            idx = self.downsample_indices(coi_frequencies[:, i], max_points)
+            ax2.plot(t[idx], coi_frequencies[idx, i], color=colors[i], label=areas[i], linewidth=2)
         ax2.set_xlabel('Time [s]')
         ax2.set_ylabel('COI Frequency [rad/s]')
         ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
@@ -446,6 +919,299 @@ class SwingSimulator:
         plt.tight_layout()
         plt.show()
         
+    def initial_conditions(self, n_each, cum_n, p_m, b, disturbances=()):
+        """初期条件（平衡角＋微小ばらつき、擾乱 (エリア, 発電機番号, Δδ) を適用）"""
+        rng = np.random.RandomState(42)  # 再現性
+        eps_spread = 0.01
+        g_total = cum_n[-1]
+        delta0 = np.zeros(g_total)
+        omega0 = np.zeros(g_total)
+
+        for i in range(len(n_each)):
+            idx_range = slice(cum_n[i], cum_n[i+1])
+            delta0[idx_range] = (np.arcsin(p_m[i] / b[i]) +
+                                 eps_spread * rng.randn(n_each[i]))
+
+        for area_idx, gen_num, dist_amp in disturbances:
+            delta0[cum_n[area_idx] + gen_num - 1] = dist_amp
+
+        return np.concatenate([delta0, omega0])
+
+    def scenario_metrics(self, coi_angles, coi_frequencies, areas):
+        """COI時系列から安定度指標（エリア別）を抽出"""
+        return {
+            'areas': list(areas),
+            'max_coi_freq_dev': np.abs(coi_frequencies).max(axis=0).tolist(),
+            'final_coi_freq': coi_frequencies[-1].tolist(),
+            'max_coi_angle_spread': float(np.ptp(coi_angles, axis=1).max()),
+        }
+
+    def validate_scenario(self, net, disturbances, events):
+        """
+        擾乱・イベントのエリア番号・発電機番号・連系線を検証（不正な場合は ValueError）
+
+        アンサンブル積分ではエリア番号をずらして連結するため、範囲外の番号は
+        別シナリオのエリアを指してしまう。積分前にすべて検証する。
+        """
+        ns = net['ns']
+        n_each = net['n_each']
+
+        def check_area(area):
+            if isinstance(area, bool) or not isinstance(area, (int, np.integer)) or not 0 <= area < ns:
+                raise ValueError(f"エリア番号が範囲外です: {area!r}（0〜{ns - 1}）")
+
+        for disturbance in disturbances:
+            area_idx, gen_num, _ = disturbance
+            check_area(area_idx)
+            if (isinstance(gen_num, bool) or not isinstance(gen_num, (int, np.integer))
+                    or not 1 <= gen_num <= n_each[area_idx]):
+                raise ValueError(f"発電機番号が範囲外です: {gen_num!r}（1〜{n_each[area_idx]}）")
+
+        for event in events or []:
+            kind = event.get('kind')
+            if 'time' not in event:
+                raise ValueError(f"イベントに時刻がありません: {event}")
+            if kind == 'trip':
+                areas = event.get('areas')
+                if areas is None or len(areas) != 2:
+                    raise ValueError(f"連系線はエリア番号2つで指定してください: {areas!r}")
+                for area in areas:
+                    check_area(area)
+                if tuple(sorted(areas)) not in net['ties']:
+                    raise ValueError(f"連系線が存在しません: {tuple(areas)}")
+            elif kind in ('fault', 'clear', 'set_p_m'):
+                check_area(event.get('area'))
+                if kind == 'set_p_m' and 'value' not in event:
+                    raise ValueError(f"set_p_m イベントに value がありません: {event}")
+            else:
+                raise ValueError(f"未対応のイベント種別です: {kind}")
+
+    def prepare_scenario(self, scenario, master_df=None):
+        """
+        シナリオ辞書から計算条件（結合構造・初期条件など）を作成
+
+        scenario のキー（すべて省略可）:
+          - 'areas'        : 対象エリア番号のリスト（Masterシートの行番号、既定は全エリア）
+          - 'overrides'    : {エリア名: {列名: 値}} Masterシートの値を上書き
+          - 'disturbances' : [(エリア, 発電機番号, Δδ)] エリアは選択後の番号
+          - 'events'       : apply_event() 形式のイベントリスト（エリアは選択後の番号）
+          - 't_final'      : シミュレーション時間 [s]
+
+        擾乱・イベントは validate_scenario() で検証する。
+        """
+        if master_df is None:
+            self.setup_excel_template()
+            master_df = self.load_parameters()
+            if master_df is None:
+                raise RuntimeError(f"パラメータを読み込めません: {self.excel_file}")
+
+        master_df = master_df.astype({column: float for column in SENSITIVITY_PARAMETERS})
+        for area, values in scenario.get('overrides', {}).items():
+            for column, value in values.items():
+                master_df.loc[master_df['Area'] == area, column] = value
+
+        selected_indices = scenario.get('areas', list(range(len(master_df))))
+        master_df = master_df.iloc[selected_indices]
+        areas = master_df['Area'].tolist()
+        ns = len(areas)
+
+        n_each = master_df['Generator_Count'].values.astype(int)
+        cum_n = np.concatenate([[0], np.cumsum(n_each)])
+        p_m_arr = master_df['p_m'].values.astype(float)
+        b_arr = master_df['b'].values.astype(float)
+        disturbances = scenario.get('disturbances', [])
+
+        net = self.build_network(n_each, ns, cum_n, p_m_arr, b_arr,
+                                 master_df['b_int'].values.astype(float),
+                                 master_df['epsilon'].values.astype(float))
+        self.validate_scenario(net, disturbances, scenario.get('events'))
+
+        return {
+            'areas': areas, 'ns': ns, 'n_each': n_each, 'cum_n': cum_n,
+            'p_m': p_m_arr, 'b': b_arr, 'net': net, 'disturbances': disturbances,
+            'init_conditions': self.initial_conditions(n_each, cum_n, p_m_arr, b_arr, disturbances),
+            'events': scenario.get('events'),
+            't_final': scenario.get('t_final', self.t_final),
+        }
+
+    def run_headless(self, scenario, master_df=None):
+        """シナリオ辞書（prepare_scenario() 参照）から対話入力・描画なしでシミュレーションし、指標を返す"""
+        case = self.prepare_scenario(scenario, master_df)
+        sol = self.integrate(case['init_conditions'], case['t_final'], case['net'], case['events'])
+
+        t_eval = np.linspace(0, case['t_final'], self.dense_samples)
+        coi_angles, coi_frequencies = self.sample_coi(sol, t_eval, case['ns'], case['cum_n'])
+        return self.scenario_metrics(coi_angles, coi_frequencies, case['areas'])
+
+    def combine_networks(self, nets):
+        """
+        複数の結合構造を互いに独立なブロックとして1つに連結（アンサンブル積分用）
+
+        k番目のメンバーの発電機・エリア番号は、それ以前のメンバーの総数だけずらす。
+        """
+        g_offsets = np.concatenate([[0], np.cumsum([net['g_total'] for net in nets])])
+        a_offsets = np.concatenate([[0], np.cumsum([net['ns'] for net in nets])])
+        e_offsets = np.concatenate([[0], np.cumsum([len(net['w']) for net in nets])])
+        g_total = int(g_offsets[-1])
+
+        def stack(key, offsets=None):
+            return np.concatenate([net[key] + (0 if offsets is None else offsets[k])
+                                   for k, net in enumerate(nets)])
+
+        ties = {}
+        for k, net in enumerate(nets):
+            for (i, j), edges in net['ties'].items():
+                ties[(i + a_offsets[k], j + a_offsets[k])] = edges + e_offsets[k]
+
+        src = stack('src', g_offsets)
+        dst = stack('dst', g_offsets)
+        gen = np.arange(g_total)
+
+        return {
+            'ns': int(a_offsets[-1]), 'n_each': stack('n_each'),
+            'cum_n': np.concatenate([[0], np.cumsum(stack('n_each'))]),
+            'g_total': g_total, 'area_of': stack('area_of', a_offsets),
+            'src': src, 'dst': dst, 'w': stack('w'), 'w0': stack('w0'), 'ties': ties,
+            'p_m_g': stack('p_m_g'), 'b_g': stack('b_g'), 'b0_g': stack('b0_g'),
+            'jac_rows': np.concatenate([gen, g_total + gen, g_total + dst]),
+            'jac_cols': np.concatenate([g_total + gen, gen, src]),
+            'edge_on': stack('edge_on'), 'b_on': stack('b_on'), 'p_m_on': stack('p_m_on'),
+            'edge_area': stack('edge_area', a_offsets),
+            'edge_dw_dbint': stack('edge_dw_dbint'), 'edge_dw_deps': stack('edge_dw_deps'),
+        }
+
+    def run_ensemble(self, cases, n_points=None):
+        """
+        同一トポロジー（エリア構成・発電機台数）の複数シナリオを1回のベクトル化積分で計算
+
+        Args:
+            cases (list): prepare_scenario() の戻り値のリスト
+            n_points (int): COI時系列の出力点数（None の場合は時系列を返さない）
+
+        Returns:
+            list: シナリオごとの {'metrics', 't', 'coi_angles', 'coi_frequencies'}
+        """
+        ns = cases[0]['ns']
+        g_total = cases[0]['cum_n'][-1]
+        t_final = max(case['t_final'] for case in cases)
+
+        # イベントのエリア番号をアンサンブル内の番号に読み替え
+        events = []
+        for k, case in enumerate(cases):
+            for event in case['events'] or []:
+                event = dict(event)
+                if 'area' in event:
+                    event['area'] += k * ns
+                if 'areas' in event:
+                    event['areas'] = tuple(a + k * ns for a in event['areas'])
+                events.append(event)
+
+        net = self.combine_networks([case['net'] for case in cases])
+        init = [case['init_conditions'] for case in cases]
+        init_conditions = np.concatenate([y0[:g_total] for y0 in init] +
+                                         [y0[g_total:] for y0 in init])
+
+        sol = self.integrate(init_conditions, t_final, net, events)
+
+        # COI時系列はシミュレーション時間ごとに1回だけ評価
+        coi_by_t_final = {}
+        for t_end in {case['t_final'] for case in cases}:
+            t_eval = np.linspace(0, t_end, self.dense_samples)
+            coi_by_t_final[t_end] = (t_eval,) + self.sample_coi(sol, t_eval, net['ns'], net['cum_n'])
+
+        results = []
+        for k, case in enumerate(cases):
+            t_eval, coi_angles, coi_frequencies = coi_by_t_final[case['t_final']]
+            coi_angles = coi_angles[:, k*ns:(k+1)*ns]
+            coi_frequencies = coi_frequencies[:, k*ns:(k+1)*ns]
+
+            result = {'metrics': self.scenario_metrics(coi_angles, coi_frequencies, case['areas'])}
+            if n_points is not None:
+                idx = self.downsample_indices(coi_frequencies, n_points)
+                result.update(t=t_eval[idx], coi_angles=coi_angles[idx],
+                              coi_frequencies=coi_frequencies[idx])
+            results.append(result)
+
+        return results
+
+    def sample_coi_sensitivity(self, sol, t_eval, ns, cum_n, n_params):
+        """拡大系の密出力解を分割評価し、COI時系列とそのパラメータ感度 (T, ns, P) を計算"""
+        g_total = cum_n[-1]
+        n_state = 2 * g_total
+        counts = np.diff(cum_n)[None, :, None]
+        starts = cum_n[:-1]
+        chunk = max(1, self.chunk_elems // (n_state * (1 + n_params)))
+
+        coi_angles = np.zeros((len(t_eval), ns))
+        coi_frequencies = np.zeros((len(t_eval), ns))
+        d_coi_angles = np.zeros((len(t_eval), ns, n_params))
+        d_coi_frequencies = np.zeros((len(t_eval), ns, n_params))
+
+        for k in range(0, len(t_eval), chunk):
+            z = sol(t_eval[k:k + chunk]).T
+            sens = z[:, n_state:].reshape(len(z), n_state, n_params)
+            angles, freqs = self.compute_coi(z[:, :n_state], ns, cum_n)
+            coi_angles[k:k + chunk] = angles
+            coi_frequencies[k:k + chunk] = freqs
+            d_coi_angles[k:k + chunk] = np.add.reduceat(sens[:, :g_total], starts, axis=1) / counts
+            d_coi_frequencies[k:k + chunk] = np.add.reduceat(sens[:, g_total:], starts, axis=1) / counts
+
+        return coi_angles, coi_frequencies, d_coi_angles, d_coi_frequencies
+
+    def run_sensitivity(self, scenario, master_df=None):
+        """
+        変分方程式による順方向感度解析（全エリア・全パラメータの感度を1回の拡大系積分で計算）
+
+        パラメータは SENSITIVITY_PARAMETERS × エリアの 4*ns 個。Masterシートの値を変えて
+        再計算した場合と同様に、平衡角を通じた初期条件への影響も含む。
+
+        Returns:
+            dict: scenario_metrics() の指標に加えて
+              - 'parameters'        : 感度の列に対応する (エリア名, パラメータ名) のリスト
+              - 't', 'coi_angles', 'coi_frequencies' : COI時系列 (T,), (T, ns)
+              - 'd_coi_angles', 'd_coi_frequencies'  : COI時系列の感度 (T, ns, P)
+              - 'd_metrics'         : 各指標の感度 (ns, P) または (P,)
+        """
+        case = self.prepare_scenario(scenario, master_df)
+        ns, cum_n, t_final = case['ns'], case['cum_n'], case['t_final']
+        n_params = len(SENSITIVITY_PARAMETERS) * ns
+
+        sens0 = self.initial_sensitivity(case['n_each'], cum_n, case['p_m'], case['b'],
+                                         case['disturbances'])
+        z0 = np.concatenate([case['init_conditions'], sens0.ravel()])
+        sol = self.join_segments(list(self.iter_segments(z0, t_final, case['net'], case['events'],
+                                                         sensitivity=True)))
+
+        t_eval = np.linspace(0, t_final, self.dense_samples)
+        coi_angles, coi_frequencies, d_coi_angles, d_coi_frequencies = \
+            self.sample_coi_sensitivity(sol, t_eval, ns, cum_n, n_params)
+
+        # 指標の感度（最大値は最大をとる時刻での微分）
+        areas_idx = np.arange(ns)
+        k_peak = np.abs(coi_frequencies).argmax(axis=0)
+        peak_sign = np.sign(coi_frequencies[k_peak, areas_idx])
+        spread = np.ptp(coi_angles, axis=1)
+        k_spread = spread.argmax()
+        i_max = coi_angles[k_spread].argmax()
+        i_min = coi_angles[k_spread].argmin()
+
+        d_metrics = {
+            'max_coi_freq_dev': peak_sign[:, None] * d_coi_frequencies[k_peak, areas_idx],
+            'final_coi_freq': d_coi_frequencies[-1],
+            'max_coi_angle_spread': d_coi_angles[k_spread, i_max] - d_coi_angles[k_spread, i_min],
+        }
+
+        result = self.scenario_metrics(coi_angles, coi_frequencies, case['areas'])
+        result.update({
+            'parameters': [(area, param) for param in SENSITIVITY_PARAMETERS
+                           for area in case['areas']],
+            't': t_eval,
+            'coi_angles': coi_angles, 'coi_frequencies': coi_frequencies,
+            'd_coi_angles': d_coi_angles, 'd_coi_frequencies': d_coi_frequencies,
+            'd_metrics': d_metrics,
+        })
+        return result
+
     def run_simulation(self):
         """シミュレーション実行"""
         print("=== 日本10エリア連成スイングシミュレーション ===")
@@ -473,7 +1239,6 @@ class SwingSimulator:
         # 4. パラメータ取得
         n_each = master_df['Generator_Count'].values
         cum_n = np.concatenate([[0], np.cumsum(n_each)])
-        g_total = cum_n[-1]
         
         print("\n=== 選択されたエリア ===")
         total_generators = sum(n_each)
@@ -495,6 +1260,7 @@ class SwingSimulator:
         
         # 5. 擾乱設定
         disturbances = self.setup_disturbances(areas, n_each)
+        events = self.setup_events(areas)
         
         # 6. パラメータセット
         p_m_arr = master_df['p_m'].values
@@ -504,52 +1270,55 @@ class SwingSimulator:
         
         base_lon_lat = self.all_lon_lat[selected_indices]
         
-        # 7. 接続行列
-        cmat = self.create_connection_matrix(selected_indices, ns)
+        # 7. 結合構造
+        net = self.build_network(n_each, ns, cum_n, p_m_arr, b_arr, b_int_arr, eps_arr)
         
-        # 8. 初期条件
-        np.random.seed(42)  # 再現性
-        eps_spread = 0.01
-        delta0 = np.zeros(g_total)
-        omega0 = np.zeros(g_total)
+        # 8. 初期条件（擾乱適用込み）
+        init_conditions = self.initial_conditions(n_each, cum_n, p_m_arr, b_arr, disturbances)
         
-        for i in range(ns):
-            idx_range = slice(cum_n[i], cum_n[i+1])
-            delta0[idx_range] = (np.arcsin(p_m_arr[i] / b_arr[i]) + 
-                               eps_spread * np.random.randn(n_each[i]))
-        
-        # 擾乱適用
         if disturbances:
             print("\n=== 擾乱適用 ===")
             for area_idx, gen_num, dist_amp in disturbances:
-                dist_global_idx = cum_n[area_idx] + gen_num - 1
-                delta0[dist_global_idx] = dist_amp
                 print(f"✓ {areas[area_idx]}エリア 第{gen_num}号機 -> {dist_amp:.3f} rad")
         
-        init_conditions = np.concatenate([delta0, omega0])
-        
         # 9. ODE求解
         print("\n=== シミュレーション実行 ===")
         print("計算中...")
         
         try:
-            t_span = np.linspace(0, 25, 1000)
-            
-            solution = odeint(self.dynamics, init_conditions, t_span, 
-                             args=(n_each, ns, cum_n, cmat, p_m_arr, b_arr, b_int_arr, eps_arr))
-            
-            print("✓ 計算完了!")
-            
-            # 10. 可視化
-            print("\n=== 可視化開始 ===")
-            print("日本地図上にシミュレーション結果を表示します")
-            print("注意: ウィンドウを閉じるとプログラムが終了します")
-            
-            self.visualize_network(t_span, solution, ns, n_each, cum_n, base_lon_lat, areas)
-            
+            if self.live_view:
+                # 10. 積分と並行して可視化
+                print("\n=== 可視化開始（計算と並行して表示） ===")
+                print("日本地図上にシミュレーション結果を表示します")
+
+                sol = self.visualize_live(init_conditions, net, events, ns, n_each, cum_n,
+                                          base_lon_lat, areas)
+
+                print("✓ 計算完了!")
+                t_dense = np.linspace(0, self.t_final, self.dense_samples)
+                coi = self.sample_coi(sol, t_dense, ns, cum_n)
+            else:
+                sol = self.integrate(init_conditions, self.t_final, net, events)
+
+                print("✓ 計算完了!")
+
+                # 密出力からCOI時系列を評価し、ピークを保持してフレーム時刻を選択
+                t_dense = np.linspace(0, self.t_final, self.dense_samples)
+                coi = self.sample_coi(sol, t_dense, ns, cum_n)
+                frame_idx = self.downsample_indices(coi[1], self.max_frames)
+                t_frames = t_dense[frame_idx]
+                solution = sol(t_frames).T
+
+                # 10. 可視化
+                print("\n=== 可視化開始 ===")
+                print("日本地図上にシミュレーション結果を表示します")
+                print("注意: ウィンドウを閉じるとプログラムが終了します")
+
+                self.visualize_network(t_frames, solution, ns, n_each, cum_n, base_lon_lat, areas)
+
             # 11. COI時系列プロット
             print("COI時系列データをプロット中...")
-            self.plot_coi_timeseries(t_span, solution, ns, n_each, cum_n, areas)
+            self.plot_coi_timeseries(t_dense, None, ns, n_each, cum_n, areas, coi=coi)
             
             print("\n✓ シミュレーション完了!")
             
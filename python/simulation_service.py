@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+simulation_service.py
+SwingSimulator を常駐させるローカルシミュレーションサービス (asyncio)
+パラメータ・地図データを保持したまま、シナリオJSONを受け付けて指標やCOI時系列を返す
+同時に届いた同一トポロジーのリクエストは1回のアンサンブル積分にまとめて計算する
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from simulate_area_network import SwingSimulator
+
+
+class SimulationService:
+    """リクエストのバッチ化・非同期ジョブ管理・HTTP応答を行う常駐サービス"""
+
+    def __init__(self, host='127.0.0.1', port=8766, batch_window=0.02, max_batch=32,
+                 ode_method='DOP853', dense_samples=2000, job_ttl=600.0, max_jobs=1000):
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window   # バッチにまとめる待ち時間 [s]
+        self.max_batch = max_batch
+
+        self.simulator = SwingSimulator()
+        # アンサンブルは状態数が大きく、この系では陰解法の線形ソルブより陽解法の方が速い
+        self.simulator.ode_method = ode_method
+        # 指標・COI時系列の評価点数（密出力の評価が応答時間の大半を占めるため抑える）
+        self.simulator.dense_samples = dense_samples
+        self.master_df = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+        self.jobs = {}              # ジョブID -> (タスク, 出力形式)
+        self.job_finished = {}      # ジョブID -> 完了時刻
+        self.job_ttl = job_ttl      # 完了済みジョブの保持時間 [s]
+        self.max_jobs = max_jobs    # 完了済みジョブの保持件数上限
+
+        # 統計情報
+        self.latencies = deque(maxlen=10000)   # (完了時刻, 遅延 [s])
+        self.batch_sizes = deque(maxlen=10000)
+
+    def warm_up(self):
+        """パラメータ・地図データの読み込みと初回積分（以降のリクエストで再利用）"""
+        self.simulator.setup_excel_template()
+        self.master_df = self.simulator.load_parameters()
+        if self.master_df is None:
+            raise RuntimeError(f"パラメータを読み込めません: {self.simulator.excel_file}")
+
+        self.simulator.get_japan_map()
+        case = self.simulator.prepare_scenario({'t_final': 0.1}, self.master_df)
+        self.simulator.run_ensemble([case])
+
+    def request_points(self, request):
+        """COI時系列の点数（省略時は plot_points、正の整数以外は ValueError）"""
+        if not isinstance(request, dict):
+            raise ValueError("リクエストはJSONオブジェクトで指定してください")
+        points = request.get('points')
+        if points is None:
+            return self.simulator.plot_points
+        if isinstance(points, bool) or not isinstance(points, int) or points <= 0:
+            raise ValueError(f"points は正の整数で指定してください: {points!r}")
+        return points
+
+    def run_batch(self, batch):
+        """
+        バッチを計算（エグゼキュータ上で実行）
+
+        同一トポロジー（エリア構成・発電機台数）のシナリオごとにアンサンブル積分する。
+        戻り値はバッチと同じ順の結果または例外のリスト。
+        """
+        results = [None] * len(batch)
+        groups = {}
+
+        for n, (request, _, _) in enumerate(batch):
+            try:
+                n_points = self.request_points(request)
+                case = self.simulator.prepare_scenario(request.get('scenario', {}), self.master_df)
+            except Exception as e:
+                results[n] = e
+                continue
+            key = (tuple(case['areas']), tuple(case['n_each']))
+            groups.setdefault(key, []).append((n, case, n_points))
+
+        for members in groups.values():
+            points = [n_points for _, _, n_points in members]
+            try:
+                outputs = self.simulator.run_ensemble([case for _, case, _ in members], max(points))
+            except Exception as e:
+                outputs = [e] * len(members)
+                # 原因のリクエストだけを失敗させるため、1件ずつ計算し直す
+                if len(members) > 1:
+                    outputs = [self.run_single(case, n_points) for _, case, n_points in members]
+
+            for (n, _, _), output, n_points in zip(members, outputs, points):
+                if isinstance(output, dict) and len(output['t']) > n_points:
+                    idx = self.simulator.downsample_indices(output['coi_frequencies'], n_points)
+                    output = dict(output, t=output['t'][idx], coi_angles=output['coi_angles'][idx],
+                                  coi_frequencies=output['coi_frequencies'][idx])
+                results[n] = output
+
+        return results
+
+    def run_single(self, case, n_points):
+        """1シナリオだけで計算（失敗時は例外を返す）"""
+        try:
+            return self.simulator.run_ensemble([case], n_points)[0]
+        except Exception as e:
+            return e
+
+    async def batch_loop(self):
+        """キューからリクエストを集めてバッチ計算し、結果を各フューチャーへ返す"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while not self.queue.empty() and len(batch) < self.max_batch:
+                batch.append(self.queue.get_nowait())
+
+            # 想定外の例外はこのバッチの全リクエストに返し、ループは継続する
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            self.batch_sizes.append(len(batch))
+
+            now = time.monotonic()
+            for (_, future, arrived), result in zip(batch, results):
+                self.latencies.append((now, now - arrived))
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def submit(self, request):
+        """リクエストを検証してキューに投入し、計算結果を待つ"""
+        self.request_points(request)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future, time.monotonic()))
+        return await future
+
+    def stats(self):
+        """遅延（p50/p95）・スループット・平均バッチサイズ"""
+        if not self.latencies:
+            return {'requests': 0}
+
+        done_at = np.array([t for t, _ in self.latencies])
+        latency = np.array([lat for _, lat in self.latencies])
+        latency_ms = latency * 1000
+        # 記録範囲の最初のリクエスト到着から最後の完了までの処理件数
+        span = max(done_at[-1] - (done_at[0] - latency[0]), 1e-9)
+
+        return {
+            'requests': len(latency_ms),
+            'p50_ms': float(np.percentile(latency_ms, 50)),
+            'p95_ms': float(np.percentile(latency_ms, 95)),
+            'throughput_rps': len(latency_ms) / span,
+            'mean_batch_size': float(np.mean(self.batch_sizes)),
+        }
+
+    async def send_json(self, writer, payload, status='200 OK'):
+        """JSON応答を送信"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode())
+        writer.write(body)
+        await writer.drain()
+
+    async def stream_result(self, writer, result, rows_per_chunk=200):
+        """指標 → COI時系列の順にNDJSONをchunked転送で送信"""
+        async def send_line(payload):
+            line = (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+            writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        await send_line({'metrics': result['metrics']})
+
+        for k in range(0, len(result['t']), rows_per_chunk):
+            rows = slice(k, k + rows_per_chunk)
+            await send_line({'t': result['t'][rows].tolist(),
+                             'coi_angles': result['coi_angles'][rows].tolist(),
+                             'coi_frequencies': result['coi_frequencies'][rows].tolist()})
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def expire_jobs(self):
+        """保持時間を過ぎた完了済みジョブと、保持件数上限を超えた古い完了済みジョブを破棄"""
+        now = time.monotonic()
+        finished = sorted(self.job_finished.items(), key=lambda item: item[1])
+        n_excess = len(finished) - self.max_jobs
+        for k, (job_id, finished_at) in enumerate(finished):
+            if k < n_excess or now - finished_at > self.job_ttl:
+                del self.jobs[job_id]
+                del self.job_finished[job_id]
+
+    def add_job(self, request):
+        """非同期ジョブを登録してIDを返す"""
+        self.expire_jobs()
+        job_id = uuid.uuid4().hex[:12]
+        task = asyncio.create_task(self.submit(request))
+        task.add_done_callback(lambda _: self.job_finished.__setitem__(job_id, time.monotonic()))
+        self.jobs[job_id] = (task, request.get('output', 'metrics'))
+        return job_id
+
+    def job_status(self, job_id):
+        """非同期ジョブの状態"""
+        if job_id not in self.jobs:
+            return None
+        task, _ = self.jobs[job_id]
+        if not task.done():
+            return {'status': 'pending'}
+        if task.exception() is not None:
+            return {'status': 'error', 'error': str(task.exception())}
+        return {'status': 'done', 'metrics': task.result()['metrics']}
+
+    async def handle(self, reader, writer):
+        """HTTPリクエスト処理（1接続1リクエスト）"""
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode().split()
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = line.decode().split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            request = json.loads(body) if body else {}
+
+            if method == 'POST' and path == '/simulate':
+                try:
+                    result = await self.submit(request)
+                except Exception as e:
+                    await self.send_json(writer, {'error': str(e)}, '400 Bad Request')
+                    return
+                if request.get('output') == 'coi':
+                    await self.stream_result(writer, result)
+                else:
+                    await self.send_json(writer, result['metrics'])
+
+            elif method == 'POST' and path == '/jobs':
+                self.request_points(request)
+                await self.send_json(writer, {'job_id': self.add_job(request)}, '202 Accepted')
+
+            elif method == 'GET' and path.startswith('/jobs/'):
+                self.expire_jobs()
+                job_id = path[len('/jobs/'):]
+                status = self.job_status(job_id)
+                if status is None:
+                    await self.send_json(writer, {'error': 'unknown job'}, '404 Not Found')
+                elif status['status'] == 'done' and self.jobs[job_id][1] == 'coi':
+                    await self.stream_result(writer, self.jobs[job_id][0].result())
+                else:
+                    await self.send_json(writer, status)
+
+            elif method == 'GET' and path == '/stats':
+                await self.send_json(writer, self.stats())
+
+            else:
+                await self.send_json(writer, {'error': 'not found'}, '404 Not Found')
+
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await self.send_json(writer, {'error': f'bad request: {e}'}, '400 Bad Request')
+        finally:
+            writer.close()
+
+    async def serve(self, ready=None):
+        """サービス起動（ready を渡すと待受開始時にセット）"""
+        loop = asyncio.get_running_loop()
+        print("モデル・地図データを読み込み中...")
+        await loop.run_in_executor(self.executor, self.warm_up)
+
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self.batch_loop())
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"✓ シミュレーションサービス起動: http://{self.host}:{self.port}")
+        if ready is not None:
+            ready.set()
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+async def http_request(host, port, method, path, payload=None):
+    """簡易HTTPクライアント（応答ボディを返す）"""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.split(b'\r\n\r\n', 1)[1]
+
+
+async def benchmark(host, port, n_requests=64, concurrency=16, scenario=None):
+    """同時リクエストを投げて遅延（p50/p95）とスループットを計測"""
+    scenario = scenario or {'t_final': 5.0, 'disturbances': [[2, 1, -1.39]]}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(k):
+        # 擾乱量を変えて毎回異なるシナリオにする
+        request = {'scenario': dict(scenario, disturbances=[[2, 1, -1.0 - 0.01 * k]])}
+        async with semaphore:
+            start = time.monotonic()
+            await http_request(host, port, 'POST', '/simulate', request)
+            latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one(k) for k in range(n_requests)))
+    elapsed = time.monotonic() - start
+
+    latency_ms = np.array(latencies) * 1000
+    report = {
+        'requests': n_requests, 'concurrency': concurrency,
+        'p50_ms': float(np.percentile(latency_ms, 50)),
+        'p95_ms': float(np.percentile(latency_ms, 95)),
+        'throughput_rps': n_requests / elapsed,
+        'service': json.loads(await http_request(host, port, 'GET', '/stats')),
+    }
+    return report
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='ローカルシミュレーションサービス')
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    serve = sub.add_parser('serve', help='サービスを起動')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8766)
+    serve.add_argument('--batch-window', type=float, default=0.02)
+    serve.add_argument('--max-batch', type=int, default=32)
+    serve.add_argument('--method', default='DOP853', help='solve_ivpの積分法')
+    serve.add_argument('--dense-samples', type=int, default=2000, help='COIの評価点数')
+    serve.add_argument('--job-ttl', type=float, default=600.0, help='完了済みジョブの保持時間 [s]')
+    serve.add_argument('--max-jobs', type=int, default=1000, help='完了済みジョブの保持件数')
+
+    bench = sub.add_parser('bench', help='起動中のサービスに同時リクエストを投げて計測')
+    bench.add_argument('--host', default='127.0.0.1')
+    bench.add_argument('--port', type=int, default=8766)
+    bench.add_argument('--requests', type=int, default=64)
+    bench.add_argument('--concurrency', type=int, default=16)
+
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        service = SimulationService(args.host, args.port, args.batch_window, args.max_batch,
+                                    args.method, args.dense_samples, args.job_ttl, args.max_jobs)
+        try:
+            asyncio.run(service.serve())
+        except KeyboardInterrupt:
+            print("\nサービスを停止しました")
+    else:
+        report = asyncio.run(benchmark(args.host, args.port, args.requests, args.concurrency))
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+test_distributed_sweep.py
+localhost 上でコーディネーターと複数ワーカーを動かし、リース喪失からの再投入を確認する
+
+実行: python -m pytest -q test_distributed_sweep.py
+"""
+
+import os
+import threading
+
+import requests
+
+from distributed_sweep import SweepCoordinator, grid_scenarios, run_worker
+from simulate_area_network import SwingSimulator
+
+
+EXCEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'area_parameters_template.xlsx')
+
+
+def load_master():
+    simulator = SwingSimulator()
+    simulator.excel_file = EXCEL_FILE
+    master_df = simulator.load_parameters()
+    master_df['Generator_Count'] = 2
+    return master_df
+
+
+def small_scenarios():
+    base = {'areas': [0, 1], 't_final': 0.5, 'disturbances': [(1, 1, -1.0)]}
+    return grid_scenarios(base, {('東北', 'p_m'): [0.1, 0.2, 0.3], ('東北', 'b'): [1.0, 1.5]})
+
+
+def test_abandoned_lease_is_requeued_and_every_scenario_finishes_once():
+    coordinator = SweepCoordinator(small_scenarios(), load_master(), batch_size=2,
+                                   lease_timeout=0.5, port=0)
+
+    # 結果の受理回数をシナリオごとに数える
+    accepted = {}
+    complete = coordinator.complete
+
+    def counting_complete(batch_id, results):
+        for sid in results:
+            if sid in coordinator.scenarios and sid not in coordinator.results:
+                accepted[sid] = accepted.get(sid, 0) + 1
+        return complete(batch_id, results)
+
+    coordinator.complete = counting_complete
+    coordinator.start()
+    url = f"http://127.0.0.1:{coordinator.port}"
+
+    # 1バッチを借りたまま放棄する（ワーカー喪失）
+    abandoned = requests.post(f"{url}/lease", json={'worker': 'lost'}, timeout=10).json()
+    assert abandoned['status'] == 'batch'
+
+    workers = [threading.Thread(target=run_worker, args=(url, f'w{k}', 0.05), daemon=True)
+               for k in range(3)]
+    for worker in workers:
+        worker.start()
+
+    results = coordinator.wait(poll_interval=0.2)
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert set(results) == set(coordinator.scenarios)
+    assert accepted == {sid: 1 for sid in coordinator.scenarios}
+    assert all('error' not in r['metrics'] for r in results.values())
+    for sid in abandoned['scenarios']:
+        assert coordinator.attempts[sid] == 2
+
+
+def test_scenario_is_abandoned_after_max_attempts():
+    coordinator = SweepCoordinator(small_scenarios(), load_master(), batch_size=10,
+                                   lease_timeout=0.1, port=0, max_attempts=1)
+    coordinator.start()
+
+    # 全シナリオを借りたまま放棄し、ワーカーなしで打ち切られることを確認
+    coordinator.lease('lost')
+    results = coordinator.wait(poll_interval=0.1)
+
+    assert set(results) == set(coordinator.scenarios)
+    assert all('error' in r['metrics'] for r in results.values())
+
+
+def test_empty_sweep_finishes_immediately():
+    coordinator = SweepCoordinator([], load_master(), port=0)
+    coordinator.start()
+    assert coordinator.wait(poll_interval=0.1) == {}
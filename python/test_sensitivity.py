@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+test_sensitivity.py
+run_sensitivity() の感度（変分方程式）を中心差分と比較する
+
+実行: python -m pytest -q test_sensitivity.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from simulate_area_network import SwingSimulator
+
+
+EXCEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'area_parameters_template.xlsx')
+
+SCENARIOS = {
+    'no_event': {'areas': [0, 1, 2], 't_final': 2.0, 'disturbances': [(1, 1, -1.0)]},
+    'set_p_m': {'areas': [0, 1, 2], 't_final': 2.0, 'disturbances': [(1, 1, -1.0)],
+                'events': [{'time': 0.5, 'kind': 'set_p_m', 'area': 2, 'value': 0.3}]},
+    'fault_clear_trip': {'areas': [0, 1, 2], 't_final': 2.0, 'disturbances': [(1, 1, -1.0)],
+                         'events': [{'time': 0.4, 'kind': 'fault', 'area': 0},
+                                    {'time': 0.5, 'kind': 'clear', 'area': 0},
+                                    {'time': 1.0, 'kind': 'trip', 'areas': (1, 2)}]},
+}
+
+METRICS = ['max_coi_freq_dev', 'final_coi_freq', 'max_coi_angle_spread']
+
+
+@pytest.fixture(scope='module')
+def simulator():
+    simulator = SwingSimulator()
+    simulator.excel_file = EXCEL_FILE
+    simulator.ode_method = 'DOP853'
+    simulator.rtol, simulator.atol = 1e-10, 1e-12
+    simulator.dense_samples = 400
+    return simulator
+
+
+@pytest.fixture(scope='module')
+def master_df(simulator):
+    master_df = simulator.load_parameters()
+    master_df['Generator_Count'] = 3
+    return master_df
+
+
+def finite_difference(simulator, scenario, master_df, area, param, t_eval, h=1e-4):
+    """Masterシートの値を ±h 変えて再計算したCOI時系列・指標の中心差分"""
+    value = float(master_df.loc[master_df['Area'] == area, param].iloc[0])
+    out = []
+    for sign in (1, -1):
+        case = simulator.prepare_scenario(dict(scenario, overrides={area: {param: value + sign*h}}),
+                                          master_df)
+        sol = simulator.integrate(case['init_conditions'], case['t_final'], case['net'],
+                                  case['events'])
+        coi_angles, coi_frequencies = simulator.sample_coi(sol, t_eval, case['ns'], case['cum_n'])
+        metrics = simulator.scenario_metrics(coi_angles, coi_frequencies, case['areas'])
+        out.append({'delta': sol(t_eval)[:case['cum_n'][-1]].T, 'coi_frequencies': coi_frequencies,
+                    **{key: np.asarray(metrics[key]) for key in METRICS}})
+    diff = {key: out[0][key] - out[1][key] for key in out[0]}
+
+    # COI角度は各発電機の角度を mod 2π してから平均するので、発電機ごとに
+    # 折り返しをまたいだ差を [-π, π) に戻してから平均する
+    d_delta = np.mod(diff.pop('delta') + np.pi, 2*np.pi) - np.pi
+    cum_n = case['cum_n']
+    diff['coi_angles'] = np.add.reduceat(d_delta, cum_n[:-1], axis=1) / np.diff(cum_n)
+    return {key: value / (2*h) for key, value in diff.items()}
+
+
+def assert_close(fd, analytic, label):
+    error = np.abs(fd - analytic).max()
+    assert error <= 1e-3 * np.abs(fd).max() + 1e-6, (label, error)
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_sensitivity_matches_finite_difference(simulator, master_df, name):
+    scenario = SCENARIOS[name]
+    result = simulator.run_sensitivity(scenario, master_df)
+
+    for j, (area, param) in enumerate(result['parameters']):
+        fd = finite_difference(simulator, scenario, master_df, area, param, result['t'])
+        assert_close(fd['coi_angles'], result['d_coi_angles'][:, :, j], (area, param, 'coi_angles'))
+        assert_close(fd['coi_frequencies'], result['d_coi_frequencies'][:, :, j],
+                     (area, param, 'coi_frequencies'))
+        for key in METRICS:
+            assert_close(fd[key], result['d_metrics'][key][..., j], (area, param, key))